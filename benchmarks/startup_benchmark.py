@@ -0,0 +1,137 @@
+"""
+Cold start benchmark for game_server.py
+
+Measures the time from process exec to the first 200 response from
+/api/leaderboard, and to the first response that actually carries data
+(a restored snapshot, or a live update that succeeded - error responses
+with loading: False don't count).
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--timeout 30] [--checkpoint leaderboard_state.json]
+
+Every run starts from a fresh temporary copy of the server, so each one is a
+true cold start. Without --checkpoint the copy has no leaderboard_state.json;
+with it, the given checkpoint is copied in to measure the snapshot path.
+
+Numbers come from `python game_server.py`, i.e. Flask's development server.
+The gunicorn entry point imports the module without running its __main__
+block, so the leaderboard updater never starts there and "first data" could
+only ever come from a checkpoint.
+"""
+import argparse
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import urllib.error
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+POLL_INTERVAL = 0.01
+STATE_FILE = 'leaderboard_state.json'
+
+
+def free_port():
+    """Ask the OS for an unused TCP port"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def prepare_server_copy(checkpoint):
+    """Copy the server into a fresh temp dir, with the given checkpoint or none"""
+    work_dir = tempfile.mkdtemp(prefix='pedro-startup-')
+    shutil.copy2(os.path.join(SERVER_DIR, 'game_server.py'), work_dir)
+    shutil.copytree(os.path.join(SERVER_DIR, 'game'), os.path.join(work_dir, 'game'))
+    bindings = os.path.join(SERVER_DIR, 'wallet_bindings.json')
+    if os.path.exists(bindings):
+        shutil.copy2(bindings, work_dir)
+    if checkpoint:
+        shutil.copy2(checkpoint, os.path.join(work_dir, STATE_FILE))
+    return work_dir
+
+
+def has_data(payload):
+    """True for a restored snapshot or a successful live update, not an error response"""
+    if payload.get('loading', True):
+        return False
+    return payload.get('from_snapshot') or payload.get('error') is None
+
+
+def measure_once(timeout, checkpoint):
+    """Start the server once, return (seconds to first 200, seconds to first response with data)"""
+    work_dir = prepare_server_copy(checkpoint)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/api/leaderboard"
+    env = dict(os.environ, PORT=str(port))
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, 'game_server.py'],
+        cwd=work_dir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    first_ok = None
+    first_data = None
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f"Server exited with code {proc.returncode}")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    if response.status == 200:
+                        elapsed = time.perf_counter() - start
+                        if first_ok is None:
+                            first_ok = elapsed
+                        if has_data(json.load(response)):
+                            first_data = elapsed
+                            break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                pass
+            time.sleep(POLL_INTERVAL)
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return first_ok, first_data
+
+
+def format_result(values):
+    if not values:
+        return "n/a"
+    return f"median {statistics.median(values) * 1000:.0f} ms (min {min(values) * 1000:.0f}, max {max(values) * 1000:.0f})"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='Number of cold starts to measure')
+    parser.add_argument('--timeout', type=float, default=30, help='Seconds to wait for each start')
+    parser.add_argument('--checkpoint', help='Leaderboard checkpoint to start each run with (default: none, cold start)')
+    args = parser.parse_args()
+
+    first_ok_times = []
+    first_data_times = []
+    for run in range(1, args.runs + 1):
+        first_ok, first_data = measure_once(args.timeout, args.checkpoint)
+        print(f"Run {run}: first 200 = {first_ok}, first data = {first_data}")
+        if first_ok is not None:
+            first_ok_times.append(first_ok)
+        if first_data is not None:
+            first_data_times.append(first_data)
+
+    print(f"Exec -> first 200 from /api/leaderboard: {format_result(first_ok_times)}")
+    print(f"Exec -> first leaderboard data:          {format_result(first_data_times)}")
+
+
+if __name__ == '__main__':
+    main()
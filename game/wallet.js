@@ -297,9 +297,11 @@ async function loadLeaderboard() {
         // Add update timestamp
         if (result.updated_at) {
             const updateTime = new Date(result.updated_at).toLocaleTimeString();
+            // Snapshot restored after a server restart - live data is still loading
+            const snapshotNote = result.from_snapshot ? ' (saved before restart, refreshing...)' : '';
             leaderboardList.innerHTML += `
                 <div style="text-align: center; margin-top: 20px; padding: 12px; color: rgba(255,255,255,0.4); font-size: 12px;">
-                    Last updated: ${updateTime}
+                    Last updated: ${updateTime}${snapshotNote}
                 </div>
             `;
         }
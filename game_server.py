@@ -2,12 +2,12 @@ from flask import Flask, send_from_directory, jsonify, request
 from flask_cors import CORS
 import os
 import json
-import requests
+import random
 import time
 import threading
 import traceback
+from collections import OrderedDict
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 app = Flask(__name__)
 CORS(app)
@@ -19,18 +19,39 @@ app.config['SEND_FILE_MAX_AGE_DEFAULT'] = 0
 leaderboard_cache = {
     'data': [],
     'updated_at': None,
-    'error': None
+    'error': None,
+    'from_snapshot': False,  # True while serving a checkpoint restored at startup
+    'tracking_start_time': None  # Tracking window the published data was computed over
 }
 
 # Incremental tracking state (persists across updates)
 trader_state = {}  # {address: {'purchases': 0, 'sales': 0, 'last_tx': timestamp}}
 last_processed_lt = None  # Track last processed logical time to avoid re-processing
-balance_cache = {}  # {address: {'balance': float, 'cached_at': timestamp}}
-BALANCE_CACHE_TTL = 180  # 3 minutes cache TTL
+balance_cache = OrderedDict()  # LRU order, {address: {'balance': float|None, 'cached_at': ts, 'expires_at': ts, 'error': str|None, 'failures': int, 'generation': int, 'invalidated': bool}}
+balance_cache_lock = threading.Lock()
+balance_refresh_targets = []  # Top-ranked addresses kept warm by the refresh-ahead thread
+balance_fetches_in_flight = {}  # {address: (Future, generation)} - shared so the updater and refresher never fetch the same wallet twice
+balance_executor = None  # Shared pool for all balance fetches, created on first use
+BALANCE_CACHE_MAX_SIZE = 1000  # Evict least recently used wallets beyond this
+BALANCE_CACHE_TTL = 180  # 3 minutes - catches transfers and other-pool swaps that never invalidate the entry
+BALANCE_CACHE_TTL_JITTER = 0.2  # +/-20% so entries don't all expire in the same cycle
+BALANCE_ERROR_TTL = 30  # Retry failed balance fetches after 30 seconds, doubling per consecutive failure
+BALANCE_ERROR_MAX_BACKOFF = 600  # Never wait more than 10 minutes between retries
+BALANCE_STALE_MAX_AGE = 1800  # Stop ranking on a last known good balance older than 30 minutes
+BALANCE_REFRESH_AHEAD_COUNT = 25  # Keep balances of the top 25 wallets warm
+BALANCE_REFRESH_AHEAD_WINDOW = 60  # Refresh entries expiring within the next minute
+BALANCE_REFRESH_INTERVAL = 20  # How often the refresh-ahead thread wakes up
 
 # Wallet-to-user bindings (persistent storage)
 BINDINGS_FILE = 'wallet_bindings.json'
 wallet_bindings = {}  # {wallet_address: {'telegram_id': int, 'display_name': str, 'username': str, 'connected_at': timestamp}}
+bindings_loaded = threading.Event()  # Set once wallet_bindings has been read from disk
+BINDINGS_LOAD_TIMEOUT = 10  # Max seconds a wallet endpoint waits for bindings to load
+
+# Leaderboard checkpoint (last published snapshot, display only - tracking still resets on deploy)
+STATE_FILE = 'leaderboard_state.json'
+STATE_MAX_AGE = 3600  # Ignore checkpoints older than 1 hour - too old to pass off as the current board
+startup_complete = threading.Event()  # Set once checkpointed state and bindings are loaded
 
 def load_wallet_bindings():
     """Load wallet bindings from JSON file"""
@@ -46,6 +67,8 @@ def load_wallet_bindings():
     except Exception as e:
         print(f"Error loading wallet bindings: {e}")
         wallet_bindings = {}
+    finally:
+        bindings_loaded.set()
 
 def save_wallet_bindings():
     """Save wallet bindings to JSON file"""
@@ -56,9 +79,6 @@ def save_wallet_bindings():
     except Exception as e:
         print(f"Error saving wallet bindings: {e}")
 
-# Load existing bindings on startup
-load_wallet_bindings()
-
 # Address normalization helper
 def normalize_address(address):
     """
@@ -195,7 +215,8 @@ def get_leaderboard():
             'updated_at': leaderboard_cache['updated_at'],
             'count': len(leaderboard_cache['data']),
             'active_traders': active_count,
-            'tracking_start_time': TRACKING_START_TIME,
+            'tracking_start_time': leaderboard_cache['tracking_start_time'] if leaderboard_cache['from_snapshot'] else TRACKING_START_TIME,
+            'from_snapshot': leaderboard_cache['from_snapshot'],  # Restored checkpoint, live update pending
             'error': leaderboard_cache.get('error')  # Include error if present
         }), 200
     
@@ -224,6 +245,10 @@ def connect_wallet():
         if not wallet_address or not telegram_id:
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
+        # Bindings load in the background at startup - don't overwrite the file before they're read
+        if not bindings_loaded.wait(timeout=BINDINGS_LOAD_TIMEOUT):
+            return jsonify({'success': False, 'error': 'Server is starting up, please retry'}), 503
+        
         # Normalize address to raw format for consistent storage
         normalized_address = normalize_address(wallet_address)
         
@@ -271,6 +296,10 @@ def disconnect_wallet():
         if not wallet_address or not telegram_id:
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
+        # Bindings load in the background at startup - don't overwrite the file before they're read
+        if not bindings_loaded.wait(timeout=BINDINGS_LOAD_TIMEOUT):
+            return jsonify({'success': False, 'error': 'Server is starting up, please retry'}), 503
+        
         # Normalize address to raw format for consistent lookup
         normalized_address = normalize_address(wallet_address)
         
@@ -306,6 +335,7 @@ def disconnect_wallet():
 
 def fetch_holder_trading_since_deployment(address, pedro_price, retry_count=0):
     """Fetch trading activity for a holder ONLY since deployment timestamp"""
+    import requests
     max_retries = 3
     try:
         # Fetch ALL jetton transfers for this address
@@ -402,7 +432,8 @@ def fetch_holder_trading_since_deployment(address, pedro_price, retry_count=0):
         return None
 
 def fetch_pedro_balance(address, retry_count=0):
-    """Fetch current PEDRO balance for a wallet address"""
+    """Fetch current PEDRO balance for a wallet address (None if the lookup failed)"""
+    import requests
     max_retries = 3
     try:
         time.sleep(DELAY_BETWEEN_REQUESTS)
@@ -415,10 +446,11 @@ def fetch_pedro_balance(address, retry_count=0):
                 print(f"Rate limited when fetching balance for {address[:8]}..., retrying...")
                 time.sleep(2)
                 return fetch_pedro_balance(address, retry_count + 1)
-            return 0
+            return None
         
         if not response.ok:
-            return 0
+            print(f"Failed to fetch balance for {address[:8]}...: {response.status_code}")
+            return None
         
         data = response.json()
         balances = data.get('balances', [])
@@ -441,11 +473,149 @@ def fetch_pedro_balance(address, retry_count=0):
         if retry_count < max_retries:
             time.sleep(1)
             return fetch_pedro_balance(address, retry_count + 1)
-        return 0
+        return None
+
+def _balance_ttl():
+    """Jittered TTL so cached balances don't all expire in the same refresh cycle"""
+    jitter = BALANCE_CACHE_TTL * BALANCE_CACHE_TTL_JITTER
+    return BALANCE_CACHE_TTL + random.uniform(-jitter, jitter)
+
+def get_cached_balance(address):
+    """Return the cache entry for an address (marking it recently used), or None"""
+    with balance_cache_lock:
+        entry = balance_cache.get(address)
+        if entry is not None:
+            balance_cache.move_to_end(address)
+        return entry
+
+def store_balance(address, balance, generation):
+    """
+    Record a balance fetch result.
+    A failed fetch (None) keeps the last known good balance instead of caching
+    0, and is retried with exponential backoff starting at BALANCE_ERROR_TTL.
+    The result is dropped if the balance was invalidated after the fetch
+    started (generation changed), since it may predate the swap. A failure
+    after a swap keeps the entry flagged as invalidated so the pre-swap
+    value is not used for ranking.
+    """
+    now = time.time()
+    with balance_cache_lock:
+        previous = balance_cache.get(address)
+        current_generation = previous['generation'] if previous else 0
+        if generation != current_generation:
+            return
+        if balance is None:
+            failures = (previous['failures'] if previous else 0) + 1
+            backoff = min(BALANCE_ERROR_TTL * 2 ** (failures - 1), BALANCE_ERROR_MAX_BACKOFF)
+            balance_cache[address] = {
+                'balance': previous['balance'] if previous else None,
+                'cached_at': previous['cached_at'] if previous else None,
+                'expires_at': now + backoff,
+                'error': 'fetch failed',
+                'failures': failures,
+                'generation': current_generation,
+                'invalidated': previous['invalidated'] if previous else False
+            }
+        else:
+            balance_cache[address] = {
+                'balance': balance,
+                'cached_at': now,
+                'expires_at': now + _balance_ttl(),
+                'error': None,
+                'failures': 0,
+                'generation': current_generation,
+                'invalidated': False
+            }
+        balance_cache.move_to_end(address)
+        
+        # Evict least recently used entries beyond the size bound
+        while len(balance_cache) > BALANCE_CACHE_MAX_SIZE:
+            balance_cache.popitem(last=False)
+
+def get_usable_balance(address):
+    """
+    Cached balance to rank on, or None if unknown, too old, or predating a swap
+    that couldn't be refetched yet (a seller may have dropped below the threshold)
+    """
+    entry = get_cached_balance(address)
+    if entry is None or entry['balance'] is None or entry['invalidated']:
+        return None
+    if time.time() - entry['cached_at'] > BALANCE_STALE_MAX_AGE:
+        return None
+    return entry['balance']
+
+def invalidate_balance(address):
+    """
+    Mark a balance stale (e.g. after an observed swap), keeping the value as fallback.
+    Bumping the generation discards any fetch that was already in flight.
+    """
+    with balance_cache_lock:
+        entry = balance_cache.get(address)
+        if entry is None:
+            # Placeholder so an in-flight first fetch still sees the generation change
+            entry = {'balance': None, 'cached_at': None, 'error': None, 'failures': 0, 'generation': 0, 'invalidated': False}
+            balance_cache[address] = entry
+            while len(balance_cache) > BALANCE_CACHE_MAX_SIZE:
+                balance_cache.popitem(last=False)
+        entry['expires_at'] = 0
+        entry['generation'] += 1
+        entry['invalidated'] = True
+
+def balance_needs_refresh(address, ahead=0):
+    """True if the balance is missing or expires within `ahead` seconds"""
+    entry = get_cached_balance(address)
+    return entry is None or entry['expires_at'] - ahead <= time.time()
+
+def _fetch_and_store_balance(address, generation):
+    """Worker for the shared balance pool: fetch, store, then release the in-flight slot if still ours"""
+    try:
+        try:
+            balance = fetch_pedro_balance(address)
+        except Exception as e:
+            print(f"Error fetching balance for {address[:8]}...: {str(e)}")
+            balance = None
+        store_balance(address, balance, generation)
+    finally:
+        with balance_cache_lock:
+            in_flight = balance_fetches_in_flight.get(address)
+            if in_flight is not None and in_flight[1] == generation:
+                del balance_fetches_in_flight[address]
+
+def refresh_balances(addresses):
+    """
+    Fetch and store balances for the given addresses and wait for them.
+    All callers share one pool of MAX_CONCURRENT_API_CALLS workers, and an
+    address already being fetched is waited on rather than fetched again -
+    unless it was invalidated since that fetch started, whose result
+    store_balance will discard.
+    """
+    global balance_executor
+    if not addresses:
+        return
+    from concurrent.futures import ThreadPoolExecutor, wait
+    
+    futures = []
+    with balance_cache_lock:
+        if balance_executor is None:
+            balance_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_API_CALLS)
+        for address in dict.fromkeys(addresses):
+            entry = balance_cache.get(address)
+            generation = entry['generation'] if entry else 0
+            in_flight = balance_fetches_in_flight.get(address)
+            if in_flight is not None and in_flight[1] == generation:
+                future = in_flight[0]
+            else:
+                future = balance_executor.submit(_fetch_and_store_balance, address, generation)
+                balance_fetches_in_flight[address] = (future, generation)
+            futures.append(future)
+    
+    wait(futures)
+
 
 def update_leaderboard_cache():
     """Incremental forward-tracking leaderboard: top 50 by total volume (≥10,000 PEDRO holders)"""
-    global trader_state, last_processed_lt, balance_cache
+    import requests
+    global trader_state, last_processed_lt, balance_refresh_targets
     
     print(f"[{datetime.now()}] Leaderboard update (tracking since {datetime.fromtimestamp(TRACKING_START_TIME)})...")
     
@@ -558,6 +728,9 @@ def update_leaderboard_cache():
                             trader_state[trader_addr]['sales'] += amount_in
                             new_swaps += 1
                         
+                        # Balance changed with this swap - drop the cached value's freshness
+                        invalidate_balance(trader_addr)
+                        
                         # Update last transaction time
                         if event_time > trader_state[trader_addr]['last_tx']:
                             trader_state[trader_addr]['last_tx'] = event_time
@@ -579,7 +752,6 @@ def update_leaderboard_cache():
         
         # Step 3: Calculate net volume for all tracked wallets
         trader_rankings = []
-        current_time = int(time_module.time())
         
         for address, data in trader_state.items():
             net_volume = data['purchases'] - data['sales']
@@ -598,39 +770,26 @@ def update_leaderboard_cache():
         
         # Step 4: Check balances for top 100 volume traders (with caching)
         top_candidates = trader_rankings[:100]  # Only check top 100 to save API calls
-        addresses_to_check = []
-        
-        for trader in top_candidates:
-            address = trader['address']
-            cached = balance_cache.get(address)
-            
-            # Check if cache is still valid
-            if not cached or (current_time - cached['cached_at']) > BALANCE_CACHE_TTL:
-                addresses_to_check.append(address)
+        addresses_to_check = [trader['address'] for trader in top_candidates if balance_needs_refresh(trader['address'])]
         
         print(f"Checking balances for {len(addresses_to_check)} wallets (cache hits: {len(top_candidates) - len(addresses_to_check)})")
         
-        # Fetch fresh balances for uncached wallets
-        if addresses_to_check:
-            with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_API_CALLS) as executor:
-                future_to_address = {executor.submit(fetch_pedro_balance, addr): addr for addr in addresses_to_check}
-                
-                for future in as_completed(future_to_address):
-                    address = future_to_address[future]
-                    try:
-                        balance = future.result()
-                        balance_cache[address] = {'balance': balance, 'cached_at': current_time}
-                    except Exception as e:
-                        print(f"Error fetching balance for {address[:8]}...: {str(e)}")
-                        balance_cache[address] = {'balance': 0, 'cached_at': current_time}
+        # Fetch fresh balances for stale or uncached wallets
+        refresh_balances(addresses_to_check)
+        
+        # Keep the top of the ranking warm between cycles
+        balance_refresh_targets = [trader['address'] for trader in top_candidates[:BALANCE_REFRESH_AHEAD_COUNT]]
         
         # Step 5: Filter for ≥10,000 PEDRO holders and build leaderboard
         qualified_traders = []
         
         for trader in top_candidates:
             address = trader['address']
-            cached = balance_cache.get(address, {})
-            balance = cached.get('balance', 0)
+            balance = get_usable_balance(address)
+            
+            # Unknown, outdated or pre-swap balance (refetch failed) - can't verify, skip for now
+            if balance is None:
+                continue
             
             # Only include wallets with ≥10,000 PEDRO (auto-removal)
             if balance >= MIN_BALANCE_THRESHOLD:
@@ -659,17 +818,95 @@ def update_leaderboard_cache():
         leaderboard_cache['data'] = active_traders
         leaderboard_cache['updated_at'] = datetime.now().isoformat()
         leaderboard_cache['error'] = None
+        leaderboard_cache['from_snapshot'] = False
+        leaderboard_cache['tracking_start_time'] = TRACKING_START_TIME
         print(f"[{datetime.now()}] Leaderboard updated with {len(active_traders)} traders")
         
+        save_leaderboard_state()
+        
     except Exception as e:
         error_msg = f"Error updating leaderboard: {str(e)}"
         print(error_msg)
         traceback.print_exc()
         leaderboard_cache['error'] = error_msg
-        leaderboard_cache['updated_at'] = datetime.now().isoformat()
+        # Keep a restored snapshot's own timestamp so it isn't shown as freshly updated
+        if not leaderboard_cache['from_snapshot']:
+            leaderboard_cache['updated_at'] = datetime.now().isoformat()
+
+def save_leaderboard_state():
+    """Checkpoint the published leaderboard to disk"""
+    state = {
+        'saved_at': time.time(),
+        'leaderboard': {
+            'data': leaderboard_cache['data'],
+            'updated_at': leaderboard_cache['updated_at'],
+            'tracking_start_time': leaderboard_cache['tracking_start_time']
+        }
+    }
+    try:
+        # Write to a temp file first so a crash never leaves a truncated checkpoint
+        tmp_file = f"{STATE_FILE}.tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_file, STATE_FILE)
+    except Exception as e:
+        print(f"Error saving leaderboard state: {e}")
+
+def load_leaderboard_state():
+    """
+    Restore the last published leaderboard snapshot so it can be served immediately.
+    The snapshot is display only: tracking still starts fresh from this deploy's
+    TRACKING_START_TIME, and the snapshot keeps reporting its own tracking window
+    until the first live update replaces it.
+    """
+    try:
+        if not os.path.exists(STATE_FILE):
+            print(f"No leaderboard checkpoint found, starting fresh")
+            return
+        with open(STATE_FILE, 'r') as f:
+            state = json.load(f)
+        
+        age = time.time() - state.get('saved_at', 0)
+        if age > STATE_MAX_AGE:
+            print(f"Leaderboard checkpoint is {int(age)}s old, ignoring it")
+            return
+        
+        snapshot = state.get('leaderboard', {})
+        if snapshot.get('updated_at'):
+            leaderboard_cache['data'] = snapshot.get('data', [])
+            leaderboard_cache['updated_at'] = snapshot['updated_at']
+            leaderboard_cache['from_snapshot'] = True
+            leaderboard_cache['tracking_start_time'] = snapshot.get('tracking_start_time')
+            print(f"Serving leaderboard snapshot from checkpoint ({int(age)}s old) until the first update")
+    except Exception as e:
+        print(f"Error loading leaderboard state: {e}")
+
+def initialize_state():
+    """Background startup: load checkpointed leaderboard first, then wallet bindings"""
+    try:
+        load_leaderboard_state()
+        load_wallet_bindings()
+    finally:
+        startup_complete.set()
+
+def balance_refresher():
+    """Background thread to refresh top-ranked balances before they expire"""
+    while True:
+        time.sleep(BALANCE_REFRESH_INTERVAL)
+        try:
+            expiring = [addr for addr in balance_refresh_targets if balance_needs_refresh(addr, ahead=BALANCE_REFRESH_AHEAD_WINDOW)]
+            if expiring:
+                print(f"Refreshing {len(expiring)} top balances ahead of expiry")
+                refresh_balances(expiring)
+        except Exception as e:
+            print(f"Error refreshing balances: {e}")
+            traceback.print_exc()
 
 def leaderboard_updater():
     """Background thread to periodically update leaderboard"""
+    # Checkpoint must be restored first, or the old snapshot could overwrite the first live update
+    startup_complete.wait()
+    
     # Small delay before first update to let Flask start
     time.sleep(2)
     
@@ -681,10 +918,16 @@ def leaderboard_updater():
         time.sleep(CACHE_REFRESH_INTERVAL)
         update_leaderboard_cache()
 
+# Load checkpoint and bindings without blocking import or the first request
+init_thread = threading.Thread(target=initialize_state, daemon=True)
+init_thread.start()
+
 if __name__ == '__main__':
     # Start background leaderboard updater NON-BLOCKING
     updater_thread = threading.Thread(target=leaderboard_updater, daemon=True)
     updater_thread.start()
+    refresher_thread = threading.Thread(target=balance_refresher, daemon=True)
+    refresher_thread.start()
     print("Leaderboard updater started in background (non-blocking)")
     print("Flask server starting immediately - leaderboard will populate in background")
     